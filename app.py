@@ -1,12 +1,25 @@
 # app.py — Executive Co-Pilot (robust full version)
 # Works even if your sheet has no header row, wrong sheet, or optional columns missing.
 
-import glob, os
+import glob, hashlib, io, json, os, re, threading
 import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
+try:  # optional: faster CSV export; falls back to pandas when missing
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+try:  # optional: bottleneck's NaN-aware reductions are single C loops with no mask temporaries
+    from bottleneck import allnan, nanmean, nansum
+except ImportError:
+    nansum, nanmean = np.nansum, np.nanmean
+    def allnan(a): return bool(np.isnan(a).all())
+
 st.set_page_config(page_title="Executive Co-Pilot", page_icon="📊", layout="wide")
 st.title("📊 Executive Co-Pilot – Mining")
 
@@ -27,54 +40,207 @@ st.sidebar.info(f"Using file: **{EXCEL_FILE}**")
 # ----------------------------
 # 1) Choose sheet & header row
 # ----------------------------
-xls = pd.ExcelFile(EXCEL_FILE)
-sheet = st.sidebar.selectbox("Choose sheet", xls.sheet_names, index=0)
+EXCEL_MTIME = os.path.getmtime(EXCEL_FILE)  # part of every cache key ⇒ editing the workbook invalidates
 
-def load_with_header(h):
-    df = pd.read_excel(EXCEL_FILE, sheet_name=sheet, header=h, engine="openpyxl")
-    df.columns = [str(c).strip() for c in df.columns]
-    return df
+@st.cache_resource(show_spinner=False)
+def open_workbooks():
+    # path → (mtime, ExcelFile, parse lock), plus a lock guarding the dict itself; lives across reruns
+    return {}, threading.Lock()
+
+def open_excel(path, mtime):
+    # one open workbook per file version, shared by every rerun/session instead of reopening the zip.
+    # calamine (Rust, pandas >= 2.2 + python-calamine) parses xlsx ~10x faster than openpyxl;
+    # older pandas raises ValueError for the unknown engine, a missing package ImportError.
+    # The lock serialises parses: neither reader is safe to share across threads.
+    books, books_lock = open_workbooks()
+    with books_lock:
+        old = books.get(path)
+        if old is not None and old[0] == mtime:
+            return old[1], old[2]
+        try:
+            xls = pd.ExcelFile(path, engine="calamine")
+        except (ImportError, ValueError):
+            # streaming SAX reader, cached cell values instead of formulas, no external-link resolution
+            xls = pd.ExcelFile(path, engine="openpyxl",
+                               engine_kwargs={"read_only": True, "data_only": True, "keep_links": False})
+        lock = threading.Lock()
+        books[path] = (mtime, xls, lock)
+    if old is not None:  # the workbook was edited: close the previous version (openpyxl keeps the fd open)
+        with old[2]:
+            old[1].close()
+    return xls, lock
+
+# Sidecars next to the workbook: Excel parsing is by far the slowest step, so after the first parse
+# new sessions / restarts read the columnar (Parquet) or JSON copies instead. All are best-effort:
+# a failed write just means parsing next time too.
+# The exact workbook mtime is in every sidecar name / stamp — compared for equality, so a replaced
+# workbook misses even when it carries an older, preserved mtime (cp -p, rsync -a, unzip).
+# Bump SIDECAR_VERSION whenever header naming/probing, cleanup or normalize() change what they
+# produce — it is part of every sidecar name/stamp, so a deploy never serves frames from older code.
+SIDECAR_VERSION = 3
+SIDECAR_KEEP = 24  # current Parquet sidecars kept per workbook (header rows × mappings tried)
+
+def sidecar_path(path, mtime, *parts):
+    return f"{path}.{mtime!r}-v{SIDECAR_VERSION}." + ".".join(map(str, parts)) + ".parquet"
+
+def read_sidecar(sidecar):
+    if os.path.exists(sidecar):
+        try:
+            return pd.read_parquet(sidecar)
+        except Exception:
+            pass
+    return None
+
+def write_sidecar(df, sidecar, path, mtime):
+    tmp = sidecar + ".tmp"
+    try:
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, sidecar)
+    except Exception:  # mixed-type columns, no pyarrow, read-only disk… the sidecar is optional
+        if os.path.exists(tmp): os.remove(tmp)
+    prune_sidecars(path, mtime)
+
+def prune_sidecars(path, mtime):
+    # drop sidecars of other workbook versions / app versions, and all but the SIDECAR_KEEP most
+    # recently written current ones — only files named by sidecar_path() are ever touched
+    ours = re.compile(re.escape(path) + r"\.\d+(\.\d+)?-v\d+\..*\.parquet")
+    current = sidecar_path(path, mtime)[:-len(".parquet")]
+    try:
+        files = [f for f in glob.glob(glob.escape(path) + ".*.parquet") if ours.fullmatch(f)]
+        fresh = sorted((f for f in files if f.startswith(current)), key=os.path.getmtime, reverse=True)
+        for f in [f for f in files if not f.startswith(current)] + fresh[SIDECAR_KEEP:]:
+            os.remove(f)
+    except OSError:  # another session pruned first, read-only disk…
+        pass
 
-# auto-pick header with fewest "Unnamed"
-scores, opts = [], []
-raw0 = pd.read_excel(EXCEL_FILE, sheet_name=sheet, header=None, engine="openpyxl")
-for h in range(0, min(8, len(raw0))):
+# sheet names + auto-detected header rows, so a cold start doesn't open the workbook just to fill
+# the sidebar; stamped with the workbook mtime so an edited file starts over
+def read_meta(path, mtime):
     try:
-        d = load_with_header(h)
-        score = sum([c.lower().startswith("unnamed") or c == "" for c in d.columns])
-        scores.append(score); opts.append(h)
-    except Exception:
+        with open(f"{path}.meta.json", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("mtime") == mtime and meta.get("version") == SIDECAR_VERSION:
+            return meta
+    except (OSError, ValueError):
         pass
-auto_header = opts[scores.index(min(scores))] if opts else 0
+    return {"mtime": mtime, "version": SIDECAR_VERSION}
+
+def write_meta(path, meta):
+    tmp = f"{path}.meta.json.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, f"{path}.meta.json")
+    except OSError:
+        if os.path.exists(tmp): os.remove(tmp)
+
+@st.cache_data(show_spinner=False)
+def sheet_names(path, mtime):
+    meta = read_meta(path, mtime)
+    if "sheets" not in meta:
+        meta["sheets"] = open_excel(path, mtime)[0].sheet_names
+        write_meta(path, meta)
+    return meta["sheets"]
+
+@st.cache_data(show_spinner=False)
+def read_sheet(path, mtime, sheet):
+    # the only Excel parse of a sheet — every header candidate below is sliced from it
+    xls, lock = open_excel(path, mtime)
+    with lock:
+        return xls.parse(sheet, header=None)
+
+def header_names(row):
+    # read_excel(header=h)-style names: blanks → "Unnamed: i", repeats → "x.1", "x.2"… skipping any
+    # suffix another header in the row already uses, unnamed columns last (pandas' parser rules).
+    # Matches calamine; openpyxl differs for error cells (#N/A → "nan", "nan.1"), which parse to the
+    # same NaN here and so become "Unnamed: i" as well (then dropped by the cleanup like any blank).
+    names, unnamed = [], []
+    for i, x in enumerate(row):
+        if isinstance(x, float) and x.is_integer(): x = int(x)  # 531.0 → "531", like read_excel
+        if pd.isna(x):
+            unnamed.append(i); names.append(f"Unnamed: {i}")
+        else:
+            names.append(str(x))
+    counts = {}
+    for i in [i for i in range(len(names)) if i not in unnamed] + unnamed:
+        base = c = names[i]
+        n = counts.get(c, 0)
+        while n > 0:
+            counts[base] = n + 1
+            c = f"{base}.{n}"
+            n = n + 1 if c in names else counts.get(c, 0)
+        names[i] = c
+        counts[c] = n + 1
+    return names
+
+def load_with_header(raw, h):
+    if h >= len(raw):
+        return pd.DataFrame(columns=[])
+    df = raw.iloc[h + 1:].reset_index(drop=True)
+    df.columns = header_names(raw.iloc[h].tolist())
+    return df.infer_objects()
+
+@st.cache_data(show_spinner=False)
+def load_raw(path, mtime, sheet, header):
+    sidecar = sidecar_path(path, mtime, sheet, header)
+    df = read_sidecar(sidecar)
+    if df is None:
+        df = load_with_header(read_sheet(path, mtime, sheet), header)
+        write_sidecar(df, sidecar, path, mtime)
+    return df
+
+@st.cache_data(show_spinner=False)
+def detect_header(path, mtime, sheet):
+    # auto-pick header with fewest "Unnamed" (runs once per file/sheet, not on every rerun)
+    meta = read_meta(path, mtime)
+    if sheet in meta.get("headers", {}):
+        return meta["headers"][sheet]
+    h = probe_header(read_sheet(path, mtime, sheet))
+    meta.setdefault("headers", {})[sheet] = h
+    write_meta(path, meta)
+    return h
+
+def probe_header(raw0):
+    scores, opts = [], []
+    for h in range(0, min(8, len(raw0))):
+        hdr = header_names(raw0.iloc[h].tolist())
+        scores.append(sum([c.lower().startswith("unnamed") or c == "" for c in hdr])); opts.append(h)
+        if scores[-1] == 0:  # can't do better, and ties already go to the earliest row
+            break
+    return opts[scores.index(min(scores))] if opts else 0
+
+sheet = st.sidebar.selectbox("Choose sheet", sheet_names(EXCEL_FILE, EXCEL_MTIME), index=0)
+auto_header = detect_header(EXCEL_FILE, EXCEL_MTIME, sheet)
 header_row = st.sidebar.number_input("Header row (0 = first row)", min_value=0, max_value=50,
                                      value=auto_header, step=1)
 
-# ---- initial load & cleanup
-df_raw = load_with_header(header_row)
-df_raw = df_raw.loc[:, ~df_raw.columns.str.lower().str.startswith("unnamed")]
-df_raw = df_raw.dropna(how="all", axis=1)
-df_raw.columns = [str(c).strip() for c in df_raw.columns]
-
 # ---- AUTO-REPAIR: if what we think are headers look like data, reload with no header and assign defaults
 def headers_look_like_data(cols):
-    num_like = 0
-    for c in list(cols)[:7]:
-        if pd.to_datetime(pd.Series([c]), errors="coerce").notna().any():
-            num_like += 1; continue
-        try:
-            float(str(c).replace(",", ""))
-            num_like += 1
-        except Exception:
-            pass
-    return num_like >= 3  # 3+ header tokens look like dates/numbers ⇒ not a real header
+    # one vectorized date parse + one numeric parse over the first 7 names (format="mixed" parses each
+    # name on its own, like the old per-name loop did)
+    s = pd.Series([str(c) for c in list(cols)[:7]], dtype=object)
+    dt_ok = pd.to_datetime(s, errors="coerce", format="mixed").notna()
+    num_ok = pd.to_numeric(s.str.replace(",", "", regex=False), errors="coerce").notna()
+    return int((dt_ok | num_ok).sum()) >= 3  # 3+ header tokens look like dates/numbers ⇒ not a real header
+
+@st.cache_data(show_spinner=False)
+def clean_raw(path, mtime, sheet, header):
+    # ---- initial load & cleanup
+    df = load_raw(path, mtime, sheet, header)
+    df = df.loc[:, ~df.columns.str.lower().str.startswith("unnamed")]
+    df = df.dropna(how="all", axis=1)
+    df.columns = df.columns.astype(str).str.strip()
+
+    if headers_look_like_data(df.columns):
+        tmp = read_sheet(path, mtime, sheet)
+        tmp = tmp.dropna(how="all", axis=1)
+        expected = ["Date","Company","Region","Units_Sold","Revenue","Market_Share_%","Customer_Satisfaction_%"]
+        use_cols = list(tmp.columns[:len(expected)])
+        df = tmp[use_cols].copy()
+        df.columns = expected[:len(use_cols)]
+    return df
 
-if headers_look_like_data(df_raw.columns):
-    tmp = pd.read_excel(EXCEL_FILE, sheet_name=sheet, header=None, engine="openpyxl")
-    tmp = tmp.dropna(how="all", axis=1)
-    expected = ["Date","Company","Region","Units_Sold","Revenue","Market_Share_%","Customer_Satisfaction_%"]
-    use_cols = list(tmp.columns[:len(expected)])
-    df_raw = tmp[use_cols].copy()
-    df_raw.columns = expected[:len(use_cols)]
+df_raw = clean_raw(EXCEL_FILE, EXCEL_MTIME, sheet, header_row)
 
 # Preview
 with st.expander("Preview current header (first 10 rows)"):
@@ -134,119 +300,346 @@ if len(set(required)) != len(required):
 # ----------------------------
 # 3) Normalize & types (robust)
 # ----------------------------
-work = df_raw.rename(columns={
-    company_col: "Company",
-    region_col:  "Region",
-    units_col:   "Units_Sold",
-    rev_col:     "Revenue",
-})
-if date_col != "<none>":
-    work = work.rename(columns={date_col: "Date"})
-if share_col != "<none>":
-    work = work.rename(columns={share_col: "Market_Share_%"})
-if csat_col != "<none>":
-    work = work.rename(columns={csat_col: "Customer_Satisfaction_%"})
-
-# ensure optional columns exist even if not mapped
-for col in ["Market_Share_%", "Customer_Satisfaction_%"]:
-    if col not in work.columns:
-        work[col] = np.nan
-
-def to_num(s):
-    return pd.to_numeric(pd.Series(s).astype(str).str.replace(",", ""), errors="coerce")
-
-if "Date" in work.columns:
-    work["Date"] = pd.to_datetime(work["Date"], errors="coerce", infer_datetime_format=True)
-work["Units_Sold"] = to_num(work.get("Units_Sold", np.nan))
-work["Revenue"]    = to_num(work.get("Revenue", np.nan))
-work["Market_Share_%"] = to_num(work["Market_Share_%"])
-work["Customer_Satisfaction_%"] = to_num(work["Customer_Satisfaction_%"])
-work["Rev_per_Unit"] = work["Revenue"] / work["Units_Sold"].replace(0, np.nan)
-if "Date" in work.columns:
-    work["Month"] = work["Date"].dt.to_period("M").dt.to_timestamp()
+def to_num(s, kind=None):
+    # kind: "integer" / "float" downcasts to the smallest dtype that holds the values
+    s = pd.Series(s)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        out = s  # xlsx numeric cells arrive typed: nothing to parse
+    elif s.dtype != object:  # dates, bools, string dtype … → text path, as before
+        out = pd.to_numeric(s.astype(str).str.replace(",", "", regex=False), errors="coerce")
+    else:
+        out = pd.to_numeric(s, errors="coerce")
+        bad = out.isna() & s.notna()  # only cells like "1,234" pay for the str round-trip
+        if bad.any():
+            out[bad] = pd.to_numeric(s[bad].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    if kind == "integer" and out.dtype.kind == "f" and out.hasnans and (out.dropna() % 1 == 0).all():
+        out = out.astype("Int64")  # whole counts with blanks: nullable int, so the downcast still applies
+    return pd.to_numeric(out, downcast=kind) if kind else out
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S"]
+
+def guess_date_format(s):
+    # the one format that parses a 50-value sample; an explicit format= takes pandas' fast strptime
+    # path instead of guessing per element. Ambiguous samples (01/02/2023 fits both day- and
+    # month-first) or no match → None → let pandas infer, as before.
+    sample = s.dropna().astype(str).head(50)
+    if not len(sample):
+        return None
+    hits = [fmt for fmt in DATE_FORMATS if pd.to_datetime(sample, format=fmt, errors="coerce").notna().all()]
+    return hits[0] if len(hits) == 1 else None
+
+def parse_dates(s):
+    fmt = guess_date_format(s)
+    out = pd.to_datetime(s, errors="coerce", format=fmt)
+    if fmt is not None and out.isna().sum() > s.isna().sum():
+        # the sample didn't speak for the whole column (values beyond it fail the format) → infer
+        out = pd.to_datetime(s, errors="coerce")
+    return out
+
+def normalize(df, mapping):
+    # one rename = one copy of the raw frame (chained .rename() calls copied it once per mapped column).
+    # mapping lists the required targets first and the first claim on a source column wins, so an
+    # optional target pointing at a column a required one took stays unmapped — as with the chained
+    # renames, where that column had already been renamed away.
+    renames = {}
+    for dst, src in mapping.items():
+        if src != "<none>" and src not in renames:
+            renames[src] = dst
+    work = df.rename(columns=renames)
+    # low-cardinality keys as categoricals (categories come out sorted): isin/groupby work on int codes
+    for col in ["Company", "Region"]:
+        work[col] = work[col].astype("category")
+
+    # ensure optional columns exist even if not mapped
+    for col in ["Market_Share_%", "Customer_Satisfaction_%"]:
+        if col not in work.columns:
+            work[col] = np.nan
+
+    # Excel dates usually arrive as datetime64 already: nothing to sniff or parse then
+    if "Date" in work.columns and not pd.api.types.is_datetime64_any_dtype(work["Date"]):
+        work["Date"] = parse_dates(work["Date"])
+    # counts, bounded percentages and per-unit prices fit int/float32; Revenue stays float64 — float32
+    # keeps ~7 significant digits, not enough for multi-crore totals
+    kinds = {"Units_Sold": "integer", "Revenue": None, "Market_Share_%": "float", "Customer_Satisfaction_%": "float"}
+    for col, kind in kinds.items():
+        work[col] = to_num(work[col], kind)
+    # division on the raw buffers: zero units → NaN via np.where, no replaced copy of the Series
+    units = work["Units_Sold"].to_numpy(dtype="float64", na_value=np.nan)
+    rev = work["Revenue"].to_numpy(dtype="float64", na_value=np.nan)
+    work["Rev_per_Unit"] = (rev / np.where(units == 0, np.nan, units)).astype("float32")
+    if "Date" in work.columns:
+        # month start via a NumPy unit cast: one C pass, no intermediate PeriodArray. tz-aware dates
+        # would go to NumPy as objects — drop the zone first (wall-clock months, as to_period gave)
+        d = work["Date"]
+        if isinstance(d.dtype, pd.DatetimeTZDtype):
+            d = d.dt.tz_localize(None)
+        work["Month"] = d.to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+
+    # leftover text columns → Arrow-backed strings (compact, no per-cell PyObject). Keys stay categorical
+    # and numbers stay NumPy: the KPI/mask code reads their raw buffers.
+    obj = work.columns[(work.dtypes == object).to_numpy()]
+    if pa is not None and len(obj):
+        work[obj] = work[obj].convert_dtypes(dtype_backend="pyarrow")
+    return work
+
+mapping = {
+    "Company": company_col, "Region": region_col, "Units_Sold": units_col, "Revenue": rev_col,
+    "Date": date_col, "Market_Share_%": share_col, "Customer_Satisfaction_%": csat_col,
+}
+
+@st.cache_data(show_spinner=False)
+def load_work(path, mtime, sheet, header, mapping):
+    # the normalized frame gets its own sidecar per mapping: a restart skips cleanup + normalize too
+    digest = hashlib.blake2b(json.dumps(mapping, sort_keys=True).encode(), digest_size=8).hexdigest()
+    sidecar = sidecar_path(path, mtime, sheet, header, digest)
+    work = read_sidecar(sidecar)
+    if work is not None:
+        # Parquet only keeps category dtype for string categories: numeric or all-null keys come back
+        # as plain float64 — re-categorize (sorted, as normalize() made them) or .cat breaks downstream
+        for col in ["Company", "Region"]:
+            if not isinstance(work[col].dtype, pd.CategoricalDtype):
+                work[col] = work[col].astype("category")
+    else:
+        work = normalize(clean_raw(path, mtime, sheet, header), mapping)
+        write_sidecar(work, sidecar, path, mtime)
+    return work
+
+work = load_work(EXCEL_FILE, EXCEL_MTIME, sheet, header_row, mapping)
+work_key = (EXCEL_FILE, EXCEL_MTIME, sheet, header_row, tuple(mapping.items()))
 
 # ----------------------------
 # 4) Filters (good UX)
 # ----------------------------
-st.sidebar.subheader("Filters")
-def uniq(series): return sorted(pd.Series(series).dropna().unique().tolist())
-companies = uniq(work["Company"]); regions = uniq(work["Region"])
+# Everything from here down runs inside one st.fragment (see the end of the file): a filter or
+# format change reruns only the dashboard, not the Excel load / mapping / normalize above.
+# Fragments can't add widgets to the sidebar, so the filters sit at the top of the main area.
+def filters(work):
+    st.subheader("Filters")
+    # categories are already unique and were sorted once at ingest — no per-rerun unique()/sort
+    companies = work["Company"].cat.categories.tolist(); regions = work["Region"].cat.categories.tolist()
+
+    fc, fr = st.columns(2)
+    sel_companies = fc.multiselect("Company", companies, default=companies or [])
+    sel_regions   = fr.multiselect("Region", regions,   default=regions   or [])
+    return tuple(sorted(sel_companies, key=str)), tuple(sorted(sel_regions, key=str))
 
-sel_companies = st.sidebar.multiselect("Company", companies, default=companies or [])
-sel_regions   = st.sidebar.multiselect("Region", regions,   default=regions   or [])
+def select_mask(work, sel_companies, sel_regions):
+    # slice(None) = the whole frame (no mask, no copy); otherwise a boolean ndarray
+    mask = slice(None)
+    for col, sel in (("Company", sel_companies), ("Region", sel_regions)):
+        s = work[col]
+        if not sel:  # an empty multiselect means "no filter"
+            continue
+        if set(sel) >= set(s.cat.categories):  # everything picked (the default): only missing keys drop out
+            if not s.hasnans:
+                continue
+            m = s.notna().to_numpy()
+        else:  # labels → category codes once, then a single gather over the int8/int16 codes
+            keep = np.zeros(len(s.cat.categories) + 1, dtype=bool)  # last slot is code -1 (missing key)
+            needle = s.cat.categories.get_indexer(list(sel))
+            keep[needle[needle >= 0]] = True
+            m = keep[s.cat.codes.to_numpy()]
+        mask = m if isinstance(mask, slice) else mask & m
+    return mask
 
-mask = (work["Company"].isin(sel_companies) if sel_companies else True) & \
-       (work["Region"].isin(sel_regions)   if sel_regions   else True)
-f = work.loc[mask].copy()
+def mean_or(a, default):
+    return default if allnan(a) else float(nanmean(a))
+
+# KPIs and chart frames are cached separately: the five scalars are tiny and stay warm whatever
+# happens to the (larger) chart cache. In both, _work is not hashed (leading underscore):
+# work_key + the selections identify the result.
+@st.cache_data(show_spinner=False)
+def compute_kpis(_work, work_key, sel_companies, sel_regions):
+    mask = select_mask(_work, sel_companies, sel_regions)
+    # KPI scalars straight off the float64 buffers — skips pandas' per-reduction Index/Block overhead
+    v = {c: _work[c].to_numpy(dtype="float64", na_value=np.nan)[mask]
+         for c in ["Revenue", "Units_Sold", "Market_Share_%", "Customer_Satisfaction_%", "Rev_per_Unit"]}
+    return dict(
+        revenue=float(nansum(v["Revenue"])),
+        units=int(nansum(v["Units_Sold"])),
+        share=round(mean_or(v["Market_Share_%"], 0.0), 2),
+        csat=round(mean_or(v["Customer_Satisfaction_%"], 0.0), 2),
+        rev_per_unit=mean_or(v["Rev_per_Unit"], np.nan),
+    )
+
+# the row-level pass happens once per work frame: every (Company, Region, Month) cell is summed here,
+# so a filter change only regroups this summary (a few hundred rows) instead of rescanning work
+@st.cache_data(show_spinner=False)
+def monthly_base(_work, work_key):
+    keys = ["Company", "Region"] + (["Month"] if "Month" in _work.columns else [])
+    return _work.groupby(keys, observed=True, dropna=False, as_index=False).agg(
+        Revenue=("Revenue", "sum"), Units_Sold=("Units_Sold", "sum"),
+        CSAT_sum=("Customer_Satisfaction_%", "sum"), CSAT_n=("Customer_Satisfaction_%", "count"),
+        Share_sum=("Market_Share_%", "sum"), Share_n=("Market_Share_%", "count"),
+    )  # means are carried as sum + count so the regrouped means stay exact
+
+@st.cache_data(show_spinner=False)
+def compute_charts(_work, work_key, sel_companies, sel_regions):
+    base = monthly_base(_work, work_key)
+    keys = ["Company", "Region"] + (["Month"] if "Month" in base.columns else [])
+    # Company/Region keep work's categories, so the same code-level mask filters the summary
+    agg = base.loc[select_mask(base, sel_companies, sel_regions)].set_index(keys)
+    by_company = agg.groupby(level="Company", observed=True).sum()
+
+    rev_piv = agg.groupby(level=["Region", "Company"], observed=True)["Revenue"].sum().unstack(fill_value=0)
+    mt = None
+    if "Month" in keys and agg.index.get_level_values("Month").notna().any():
+        mt = agg.groupby(level="Month")[["Revenue","Units_Sold"]].sum()
+        mt = mt.asfreq("MS", fill_value=0).rename_axis("Date").reset_index()  # keep empty months, as Grouper did
+    cs = (by_company["CSAT_sum"] / by_company["CSAT_n"]).rename("Customer_Satisfaction_%").dropna().reset_index()
+    comp = by_company.assign(Share=by_company["Share_sum"] / by_company["Share_n"])[["Revenue", "Share"]]\
+            .reset_index()
+    return dict(rev_piv=rev_piv, mt=mt, cs=cs, comp=comp)
 
 # ----------------------------
 # 5) KPIs
 # ----------------------------
 fmt_money = lambda x: f"₹{x:,.0f}" if pd.notnull(x) else "—"
-c1, c2, c3, c4, c5 = st.columns(5)
-c1.metric("Revenue", fmt_money(f["Revenue"].sum()))
-c2.metric("Units", int(f["Units_Sold"].sum()) if f["Units_Sold"].notna().any() else 0)
-c3.metric("Avg Share %", round(f["Market_Share_%"].mean(), 2) if f["Market_Share_%"].notna().any() else 0.0)
-c4.metric("Avg CSAT %",  round(f["Customer_Satisfaction_%"].mean(), 2) if f["Customer_Satisfaction_%"].notna().any() else 0.0)
-c5.metric("Avg Rev/Unit", fmt_money(f["Rev_per_Unit"].mean()))
+def show_kpis(kpis):
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Revenue", fmt_money(kpis["revenue"]))
+    c2.metric("Units", kpis["units"])
+    c3.metric("Avg Share %", kpis["share"])
+    c4.metric("Avg CSAT %",  kpis["csat"])
+    c5.metric("Avg Rev/Unit", fmt_money(kpis["rev_per_unit"]))
 
 # ----------------------------
 # 6) Charts (robust)
 # ----------------------------
-a, b = st.columns(2)
-with a:
-    rev_piv = f.pivot_table(index="Region", columns="Company", values="Revenue", aggfunc="sum", fill_value=0)
-    st.plotly_chart(px.bar(rev_piv, barmode="group", title="Revenue by Region × Company"),
-                    use_container_width=True)
-
-with b:
-    if "Date" in f.columns and f["Date"].notna().any():
-        mt = f.dropna(subset=["Date"]).copy()
-        mt["Date"] = pd.to_datetime(mt["Date"], errors="coerce")
-        mt = mt.groupby(pd.Grouper(key="Date", freq="MS")).agg(
-            Revenue=("Revenue","sum"),
-            Units_Sold=("Units_Sold","sum")
-        ).reset_index()
-        value_cols = [c for c in ["Revenue","Units_Sold"]
-                      if pd.to_numeric(mt[c], errors="coerce").notna().any()]
-        if len(value_cols) >= 1 and mt["Date"].notna().any():
-            mt_long = mt.melt(id_vars="Date", value_vars=value_cols,
-                              var_name="Metric", value_name="Value")
-            st.plotly_chart(
-                px.line(mt_long, x="Date", y="Value", color="Metric",
-                        title="Monthly Trend", markers=True),
-                use_container_width=True
-            )
+# Figures are cached on the *content* of their (tiny) aggregate frame, so a selection that leaves a
+# chart's numbers unchanged reuses the built figure. cache_resource hands back the same object.
+def frame_key(df):
+    h = hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes(), digest_size=16)
+    h.update(repr([df.index.name] + list(df.columns)).encode())
+    return h.hexdigest()
+
+# Built with graph_objects directly: the figures are fixed, so Plotly Express' per-call DataFrame
+# introspection, wide→long reshaping and hover-template generation is pure overhead.
+def layout(title, x, y, legend=None):
+    return dict(title=title, xaxis_title=x, yaxis_title=y, legend_title_text=legend)
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def revenue_fig(key, _rev_piv):
+    regions = _rev_piv.index.tolist()
+    data = [go.Bar(name=str(c), x=regions, y=_rev_piv[c].to_numpy()) for c in _rev_piv.columns]
+    return go.Figure(data, layout(title="Revenue by Region × Company", x="Region", y="value", legend="Company")
+                     | dict(barmode="group"))
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def trend_fig(key, _mt):
+    data = [go.Scatter(name=c, x=_mt["Date"], y=_mt[c].to_numpy(), mode="lines+markers")
+            for c in _mt.columns if c != "Date"]
+    return go.Figure(data, layout("Monthly Trend", x="Date", y="Value", legend="Metric"))
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def csat_fig(key, _cs):
+    data = [go.Bar(x=_cs["Customer_Satisfaction_%"].to_numpy(), y=_cs["Company"].tolist(), orientation="h")]
+    return go.Figure(data, layout("Avg CSAT by Company", x="Customer_Satisfaction_%", y="Company"))
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def share_fig(key, _comp):
+    data = [go.Scatter(x=_comp["Share"].to_numpy(), y=_comp["Revenue"].to_numpy(), text=_comp["Company"].tolist(),
+                       mode="markers+text", textposition="top center")]
+    return go.Figure(data, layout("Market Share vs Revenue", x="Share", y="Revenue"))
+
+def show_charts(views):
+    a, b = st.columns(2)
+    with a:
+        rev_piv = views["rev_piv"]
+        st.plotly_chart(revenue_fig(frame_key(rev_piv), rev_piv), use_container_width=True)
+
+    with b:
+        mt = views["mt"]
+        if mt is not None:
+            value_cols = [c for c in ["Revenue","Units_Sold"]
+                          if pd.to_numeric(mt[c], errors="coerce").notna().any()]
+            if len(value_cols) >= 1 and mt["Date"].notna().any():
+                mt = mt[["Date"] + value_cols]
+                st.plotly_chart(trend_fig(frame_key(mt), mt), use_container_width=True)
+            else:
+                st.info("Monthly trend has no numeric data to plot.")
         else:
-            st.info("Monthly trend has no numeric data to plot.")
-    else:
-        st.info("No Date column mapped — skipping monthly trend.")
-
-a, b = st.columns(2)
-with a:
-    cs = f.groupby("Company", as_index=False)["Customer_Satisfaction_%"].mean().dropna()
-    if not cs.empty:
-        st.plotly_chart(px.bar(cs, x="Customer_Satisfaction_%", y="Company",
-                               orientation="h", title="Avg CSAT by Company"),
-                        use_container_width=True)
-    else:
-        st.info("CSAT column not provided.")
-with b:
-    comp = f.groupby("Company", as_index=False)\
-            .agg(Revenue=("Revenue","sum"), Share=("Market_Share_%","mean"))
-    if comp["Share"].notna().any():
-        fig = px.scatter(comp, x="Share", y="Revenue", text="Company",
-                         title="Market Share vs Revenue")
-        fig.update_traces(textposition="top center")
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.info("Market Share column not provided.")
+            st.info("No Date column mapped — skipping monthly trend.")
+
+    a, b = st.columns(2)
+    with a:
+        cs = views["cs"]
+        if not cs.empty:
+            st.plotly_chart(csat_fig(frame_key(cs), cs), use_container_width=True)
+        else:
+            st.info("CSAT column not provided.")
+    with b:
+        comp = views["comp"]
+        if comp["Share"].notna().any():
+            st.plotly_chart(share_fig(frame_key(comp), comp), use_container_width=True)
+        else:
+            st.info("Market Share column not provided.")
 
 # ----------------------------
 # 7) Download
 # ----------------------------
-st.subheader("⬇️ Download")
-st.download_button("Download filtered CSV",
-                   data=f.to_csv(index=False).encode("utf-8"),
-                   file_name="filtered_view.csv",
-                   mime="text/csv")
+def csv_bytes(df):
+    # pyarrow's multi-threaded C++ writer goes straight to bytes (no intermediate str + encode)
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # date-only columns (Date, Month) as plain dates, like to_csv writes them — otherwise Arrow
+            # prints "2023-12-23 00:00:00.000000000". Real timestamps keep their unit and sub-seconds.
+            for i, fld in enumerate(table.schema):
+                if pa.types.is_timestamp(fld.type) and fld.type.tz is None:
+                    col = table.column(i)
+                    if pc.all(pc.equal(col, pc.floor_temporal(col, unit="day"))).as_py() is not False:
+                        table = table.set_column(i, pa.field(fld.name, pa.date32()), col.cast(pa.date32()))
+            buf = io.BytesIO()
+            pacsv.write_csv(table, buf)
+            return buf.getvalue()
+        except pa.ArrowException:  # e.g. a mixed-type leftover column Arrow can't type
+            pass
+    return df.to_csv(index=False).encode("utf-8")
+
+# Parquet/Feather are columnar + compressed: a fraction of the CSV size and far faster to load back
+EXPORTS = {"CSV": ("csv", "text/csv"),
+           "Parquet": ("parquet", "application/octet-stream"),
+           "Feather": ("feather", "application/octet-stream")}
+
+def export_bytes(df, fmt):
+    if fmt == "CSV":
+        return csv_bytes(df)
+    buf = io.BytesIO()
+    if fmt == "Parquet":
+        df.to_parquet(buf, compression="zstd", index=False)
+    else:
+        df.reset_index(drop=True).to_feather(buf)  # feather needs a default RangeIndex
+    return buf.getvalue()
+
+# cached like the KPIs (_work unhashed): a rerun with the same view and format reuses the bytes
+# instead of re-serializing the whole filtered frame, whether or not anyone clicks the button
+@st.cache_data(show_spinner=False, max_entries=8)
+def download_bytes(_work, work_key, sel_companies, sel_regions, fmt):
+    view = _work.loc[select_mask(_work, sel_companies, sel_regions)]
+    try:
+        return fmt, export_bytes(view, fmt)
+    except Exception:  # Arrow can't type a mixed-type leftover column
+        return "CSV", csv_bytes(view)
+
+def show_download(work, work_key, sel_key):
+    st.subheader("⬇️ Download")
+    fmt = st.radio("Format", list(EXPORTS) if pa is not None else ["CSV"], horizontal=True)
+    got, data = download_bytes(work, work_key, *sel_key, fmt)
+    if got != fmt:
+        st.warning(f"This view can't be written as {fmt} — falling back to CSV.")
+    fmt = got
+    ext, mime = EXPORTS[fmt]
+    st.download_button(f"Download filtered {fmt}", data=data, file_name=f"filtered_view.{ext}", mime=mime)
+
+# ----------------------------
+# 8) Dashboard (one fragment)
+# ----------------------------
+@st.fragment
+def dashboard(work, work_key):
+    sel_key = filters(work)
+    show_kpis(compute_kpis(work, work_key, *sel_key))
+    show_charts(compute_charts(work, work_key, *sel_key))
+    show_download(work, work_key, sel_key)
+
+dashboard(work, work_key)